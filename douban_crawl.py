@@ -1,14 +1,19 @@
 """抓取豆瓣书/电影列表，生成 books、movies 及合并 JSON。"""
 
-import json
 import os
+import queue
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests_cache import DEFAULT_IGNORED_PARAMS, DO_NOT_CACHE, CachedSession
+from lxml import html as lhtml
+from lxml.etree import ParserError, XPath
 from tqdm import tqdm
 
 
@@ -19,36 +24,75 @@ BOOK_RAW_FILE = "douban_books_raw.json"
 MOVIE_RAW_FILE = "douban_movies_raw.json"
 ALL_RAW_FILE = "douban_export_raw.json"
 DIRECTOR_DELAY = float(os.getenv("DIRECTOR_DELAY", "0.3"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "5"))
+# GET 响应缓存到本地 SQLite，重复运行时直接读盘；设为 0 即完全不缓存
+HTTP_CACHE_FILE = ".http_cache.sqlite"
+HTTP_CACHE_EXPIRE = int(os.getenv("HTTP_CACHE_EXPIRE", "86400"))
 
+RATING_RE = re.compile(r"rating(\d+)-t")
+SPLIT_PEOPLE_RE = re.compile(r"[、/,，；;]+")
+DIRECTOR_LABEL_RE = re.compile(r"(导演|Director(?:s)?)[:：]\s*", re.IGNORECASE)
+# #info 里导演字段之后可能出现的下一个字段名，合成一个正则一次扫描
+STOP_TOKENS = [
+    "主演", "演员", "类型", "片长", "又名", "首播", "上映", "语言", "编剧",
+    "国家", "地区", "季数", "集数", "Starring", "Cast",
+]
+STOP_RE = re.compile("|".join(re.escape(t) for t in STOP_TOKENS))
 
-def make_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({
+
+def has_class(name: str) -> str:
+    """XPath 谓词：class 属性里含有完整的 name（等价于 CSS 的 .name）。"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+# 列表页的条目 XPath 只编译一次；条目内部字段由 index_item 一次遍历取出
+BOOK_ITEMS_XP = XPath(f"//*[{has_class('subject-item')}]")
+MOVIE_ITEMS_XP = XPath(f"//*[{has_class('item')}]")
+ITEM_FIELD_CLASSES = ("comment", "pub", "pubtime", "date")
+
+
+def make_headers() -> Dict[str, str]:
+    return {
         "User-Agent": (
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
             "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
         ),
+        "Accept-Encoding": "gzip, deflate, br",
         "Cookie": DOUBAN_COOKIE,
-    })
+    }
+
+
+def make_session() -> requests.Session:
+    # Cookie 不进缓存键，也不随请求一起写入 SQLite
+    s = CachedSession(
+        HTTP_CACHE_FILE,
+        expire_after=HTTP_CACHE_EXPIRE if HTTP_CACHE_EXPIRE > 0 else DO_NOT_CACHE,
+        allowable_methods=("GET",),
+        ignored_parameters=[*DEFAULT_IGNORED_PARAMS, "Cookie"],
+    )
+    s.cache.delete(expired=True)
+    s.headers.update(make_headers())
     return s
 
 
-def fetch_html(session: requests.Session, url: str) -> Optional[str]:
+def fetch_html(session: requests.Session, url: str) -> Tuple[Optional[str], bool]:
+    """返回 (html, from_cache)；命中本地缓存时调用方不必再等请求间隔。"""
     try:
         resp = session.get(url, timeout=10)
+        from_cache = getattr(resp, "from_cache", False)
         if resp.status_code == 200:
-            return resp.text
+            return resp.text, from_cache
         print(f"[WARN] {url} -> status {resp.status_code}")
-        return None
+        return None, from_cache
     except Exception as e:
         print(f"[ERROR] Failed to fetch {url}: {e}")
-        return None
+        return None, False
 
 
 def extract_rating_from_classes(classes: List[str]) -> Optional[int]:
     """从 class 名里提取 ratingX-t 形式的分数。"""
     for c in classes:
-        m = re.search(r"rating(\d+)-t", c)
+        m = RATING_RE.search(c)
         if m:
             try:
                 return int(m.group(1))
@@ -60,30 +104,27 @@ def extract_rating_from_classes(classes: List[str]) -> Optional[int]:
 def split_people(text: str) -> List[str]:
     if not text:
         return []
-    return [p.strip() for p in re.split(r"[、/,，；;]+", text) if p.strip()]
+    return [p.strip() for p in SPLIT_PEOPLE_RE.split(text) if p.strip()]
 
 
 def extract_directors_from_detail(html: str) -> List[str]:
-    soup = BeautifulSoup(html, "html.parser")
-    directors = [a.get_text(strip=True) for a in soup.select('a[rel="v:directedBy"]')]
+    # 详情页只需要导演链接和 #info，直接用 lxml 解析，省掉 bs4 的包装开销
+    try:
+        tree = lhtml.fromstring(html)
+    except ParserError:  # 空白页面，bs4 时代同样返回空列表
+        return []
+    directors = [text_of(a) for a in tree.xpath('//a[@rel="v:directedBy"]')]
     if directors:
         return directors
-    info_div = soup.select_one("#info")
-    if info_div:
-        info_text = info_div.get_text(" ", strip=True)
+    info_div = tree.get_element_by_id("info", None)
+    if info_div is not None:
+        info_text = " ".join(t.strip() for t in info_div.itertext() if t.strip())
         # 先找“导演:”标签
-        m = re.search(r"(导演|Director(?:s)?)[:：]\s*", info_text, flags=re.IGNORECASE)
+        m = DIRECTOR_LABEL_RE.search(info_text)
         if m:
             rest = info_text[m.end():]
-            stop_tokens = [
-                "主演", "演员", "类型", "片长", "又名", "首播", "上映", "语言", "编剧",
-                "国家", "地区", "季数", "集数", "Starring", "Cast",
-            ]
-            stop_idx = len(rest)
-            for tok in stop_tokens:
-                idx = rest.find(tok)
-                if idx != -1 and idx < stop_idx:
-                    stop_idx = idx
+            m2 = STOP_RE.search(rest)
+            stop_idx = m2.start() if m2 else len(rest)
             segment = rest[:stop_idx]
             segment = segment.split("/", 1)[0]
             dirs = split_people(segment)
@@ -92,39 +133,81 @@ def extract_directors_from_detail(html: str) -> List[str]:
     return []
 
 
+def index_item(it: lhtml.HtmlElement) -> Dict[str, lhtml.HtmlElement]:
+    """一次遍历条目子树，按 CSS 选择器的含义记下各字段第一次出现的元素。"""
+    found: Dict[str, lhtml.HtmlElement] = {}
+    for el in it.iterdescendants():
+        if not isinstance(el.tag, str):
+            continue  # 注释等非元素节点
+        cls = el.get("class", "")
+        if el.tag == "a":
+            found.setdefault("a", el)
+            if "nbg" in cls.split():
+                found.setdefault("a.nbg", el)
+            parent = el.getparent()
+            while parent is not None and parent is not it:
+                if parent.tag == "h2":
+                    found.setdefault("h2 a", el)
+                elif parent.tag == "li" and "title" in parent.get("class", "").split():
+                    found.setdefault("li.title a", el)
+                parent = parent.getparent()
+        if not cls:
+            continue
+        if "rating" in cls:
+            found.setdefault("rating", el)
+        tokens = cls.split()
+        for name in ITEM_FIELD_CLASSES:
+            if name in tokens:
+                found.setdefault(name, el)
+    return found
+
+
+def text_of(el) -> str:
+    """与 bs4 的 get_text(strip=True) 一致：各文本节点去空白后拼接。
+
+    评论、日期等纯文本叶子节点直接用 text_content().strip()。
+    """
+    return "".join(t.strip() for t in el.itertext() if t.strip())
+
+
 def parse_book_collect_page(html: str) -> List[Dict]:
-    soup = BeautifulSoup(html, "html.parser")
+    try:
+        tree = lhtml.fromstring(html)
+    except ParserError:  # 空白页面当作没有条目，翻页到此为止
+        return []
     result = []
 
-    items = soup.select(".subject-item")
-    for it in items:
-        a_tag = it.select_one("h2 a")
-        if not a_tag:
+    for it in BOOK_ITEMS_XP(tree):
+        fields = index_item(it)
+        a_tag = fields.get("h2 a")
+        if a_tag is None:
             continue
-        title = a_tag.get_text(strip=True)
-        href = a_tag.get("href", "").strip()
+        title = text_of(a_tag)
+        href = (a_tag.get("href") or "").strip()
 
-        rating_span = it.select_one('[class*="rating"]')
+        rating_span = fields.get("rating")
         rating = None
-        if rating_span:
-            rating = extract_rating_from_classes(rating_span.get("class", []))
+        if rating_span is not None:
+            rating = extract_rating_from_classes(rating_span.get("class", "").split())
         if rating is None:
-            rating = extract_rating_from_classes(it.get("class", []))
+            rating = extract_rating_from_classes(it.get("class", "").split())
 
-        comment_span = it.select_one(".comment")
-        comment = comment_span.get_text(strip=True) if comment_span else ""
+        comment_span = fields.get("comment")
+        comment = comment_span.text_content().strip() if comment_span is not None else ""
 
-        pub_span = it.select_one(".pub")
+        pub_span = fields.get("pub")
         authors = []
-        if pub_span:
-            pub_text = pub_span.get_text(" ", strip=True)
+        if pub_span is not None:
+            pub_text = pub_span.text_content().strip()
             authors_text = pub_text.split("/", 1)[0]
             authors = split_people(authors_text)
 
-        date_span = it.select_one(".pubtime") or it.select_one(".date")
+        date_span = fields.get("pubtime")
+        if date_span is None:
+            date_span = fields.get("date")
         date_text = ""
-        if date_span:
-            raw_date = date_span.get_text(strip=True)
+        if date_span is not None:
+            raw_date = date_span.text_content().strip()
             date_text = raw_date.split()[0]  # 取空格前的日期部分
 
         result.append({
@@ -141,29 +224,33 @@ def parse_book_collect_page(html: str) -> List[Dict]:
 
 
 def parse_movie_collect_page(html: str) -> List[Dict]:
-    soup = BeautifulSoup(html, "html.parser")
+    try:
+        tree = lhtml.fromstring(html)
+    except ParserError:  # 空白页面当作没有条目，翻页到此为止
+        return []
     result = []
 
-    items = soup.select(".item")
-    for it in items:
-        a_tag = it.select_one("li.title a") or it.select_one("a.nbg") or it.select_one("a")
-        if not a_tag:
+    for it in MOVIE_ITEMS_XP(tree):
+        fields = index_item(it)
+        # lxml 元素的真值取决于有无子节点，这里必须显式判 None
+        a_tag = next((fields[k] for k in ("li.title a", "a.nbg", "a") if k in fields), None)
+        if a_tag is None:
             continue
-        title = a_tag.get_text(strip=True)
-        href = a_tag.get("href", "").strip()
+        title = text_of(a_tag)
+        href = (a_tag.get("href") or "").strip()
 
-        rating_span = it.select_one('[class*="rating"]')
+        rating_span = fields.get("rating")
         rating = None
-        if rating_span:
-            rating = extract_rating_from_classes(rating_span.get("class", []))
+        if rating_span is not None:
+            rating = extract_rating_from_classes(rating_span.get("class", "").split())
         if rating is None:
-            rating = extract_rating_from_classes(it.get("class", []))
+            rating = extract_rating_from_classes(it.get("class", "").split())
 
-        comment_span = it.select_one(".comment")
-        comment = comment_span.get_text(strip=True) if comment_span else ""
+        comment_span = fields.get("comment")
+        comment = comment_span.text_content().strip() if comment_span is not None else ""
 
-        date_span = it.select_one(".date")
-        date_text = date_span.get_text(strip=True) if date_span else ""
+        date_span = fields.get("date")
+        date_text = date_span.text_content().strip() if date_span is not None else ""
 
         result.append({
             "category": "movie",
@@ -186,39 +273,94 @@ def crawl_collect_list(
     per_page: int = 15,
     delay: float = 1.5,
 ) -> List[Dict]:
+    # 抓取线程取页面、主线程解析，网络等待和解析互相重叠。
+    # credits 控制预取：主线程每解析完一页才放行下一次抓取，最多领先一页，
+    # 所以到末页时最多多抓一页。
+    pages: "queue.Queue[Optional[Tuple[int, str]]]" = queue.Queue()
+    credits = threading.Semaphore(2)
+    stop = threading.Event()
+
+    def producer() -> None:
+        try:
+            for page_idx in range(max_pages):
+                credits.acquire()
+                if stop.is_set():
+                    break
+                start = page_idx * per_page
+                url = f"{base_url}?start={start}&sort=time&rating=all&filter=all&mode=grid"
+                html, from_cache = fetch_html(session, url)
+                if not html:
+                    break
+                pages.put((page_idx, html))
+                if not from_cache:
+                    time.sleep(delay)
+        finally:
+            pages.put(None)
+
+    fetcher = threading.Thread(target=producer, daemon=True)
+    fetcher.start()
+
     all_items: List[Dict] = []
-    for page_idx in range(max_pages):
-        start = page_idx * per_page
-        url = f"{base_url}?start={start}&sort=time&rating=all&filter=all&mode=grid"
-        html = fetch_html(session, url)
-        if not html:
-            break
+    try:
+        while True:
+            page = pages.get()
+            if page is None:
+                break
+
+            page_idx, html = page
+            items = parser(html)
+            if not items:
+                break
+
+            all_items.extend(items)
+            print(f"[INFO] {base_url} page {page_idx+1}: {len(items)} items")
+            credits.release()
+    finally:
+        # 正常结束、末页或解析出错都要让抓取线程退出
+        stop.set()
+        credits.release()
+        fetcher.join()
+    return all_items
 
-        items = parser(html)
-        if not items:
-            break
 
-        all_items.extend(items)
-        print(f"[INFO] {base_url} page {page_idx+1}: {len(items)} items")
-        time.sleep(delay)
+class RequestPacer:
+    """多个线程共用的请求节奏：任意两次网络请求之间至少间隔 interval 秒。"""
 
-    return all_items
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            if self.next_at > now:
+                time.sleep(self.next_at - now)
+                now = self.next_at
+            self.next_at = now + self.interval
+
+
+def fetch_directors(session: requests.Session, url: str, pacer: RequestPacer) -> Optional[List[str]]:
+    if not session.cache.contains(url=url):  # 缓存命中不占用请求配额
+        pacer.wait()
+    html, _ = fetch_html(session, url)
+    if not html:
+        return None
+    return extract_directors_from_detail(html)
 
 
 def enrich_movie_directors(session: requests.Session, movies: List[Dict]) -> List[Dict]:
-    """对每部电影访问详情页，获取导演。"""
-    if not movies:
+    """用线程池并发访问每部电影的详情页，获取导演。"""
+    targets = [item for item in movies if item.get("subject_url")]
+    if not targets:
         return movies
-    for item in tqdm(movies, desc="Fetching directors from detail"):
-        url = item.get("subject_url")
-        if not url:
-            continue
-        html = fetch_html(session, url)
-        if not html:
-            continue
-        dirs = extract_directors_from_detail(html)
-        item["directors_zh"] = dirs
-        time.sleep(DIRECTOR_DELAY)
+    pacer = RequestPacer(DIRECTOR_DELAY)
+    with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as ex:
+        futs = {ex.submit(fetch_directors, session, item["subject_url"], pacer): item for item in targets}
+        for f in tqdm(as_completed(futs), total=len(futs), desc="Fetching directors from detail"):
+            dirs = f.result()
+            if dirs is not None:
+                futs[f]["directors_zh"] = dirs
     return movies
 
 
@@ -243,10 +385,7 @@ def crawl_all() -> Dict[str, List[Dict]]:
 
 
 def save_json(path: Path, data: List[Dict]) -> None:
-    path.write_text(
-        json.dumps(data, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
     print(f"[INFO] saved {len(data)} items to {path}")
 
 
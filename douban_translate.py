@@ -1,13 +1,14 @@
 """翻译书/电影数据，产出英文标题、作者/导演及评论。"""
 
-import json
+import asyncio
 import os
 import re
-import time
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from openai import OpenAI
+import orjson
+from aiolimiter import AsyncLimiter
+from openai import AsyncOpenAI
 from tqdm import tqdm
 
 
@@ -16,12 +17,24 @@ MOVIE_RAW_FILE = "douban_movies_raw.json"
 BOOK_TRANSLATED_FILE = "douban_books_translated.json"
 MOVIE_TRANSLATED_FILE = "douban_movies_translated.json"
 ALL_TRANSLATED_FILE = "douban_export_translated.json"
+# 人名译名缓存，同一作者/导演在整个项目里只翻译一次
+PERSON_CACHE_FILE = Path(".person_cache.json")
 
 QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
 QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 QWEN_MODEL = os.getenv("QWEN_MODEL", "qwen-plus")
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "50"))
+BATCH_SIZE = int(os.getenv("TRANSLATE_BATCH_SIZE", "10"))
+CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "8"))
+RATE_PER_SECOND = float(os.getenv("TRANSLATE_RPS", "10"))
 
-qwen_client = OpenAI(api_key=QWEN_API_KEY, base_url=QWEN_BASE_URL)
+TITLE_ALT_SPLIT_RE = re.compile(r"[／/|]")
+HAS_LATIN_RE = re.compile(r"[A-Za-z]")
+
+qwen_client = AsyncOpenAI(api_key=QWEN_API_KEY, base_url=QWEN_BASE_URL)
+# 所有 Qwen 请求共用的并发上限和 RPS 限速
+qwen_sem = asyncio.Semaphore(CONCURRENCY)
+qwen_limiter = AsyncLimiter(RATE_PER_SECOND, 1)
 
 REVIEW_SYSTEM_PROMPT = (
     "You are a professional translator specializing in reviews of books and films. "
@@ -32,72 +45,146 @@ REVIEW_SYSTEM_PROMPT = (
     "Output only the translated English review, without any explanations."
 )
 
+# 单条/批量结构化翻译共用的字段说明；条目本身只作为 user 内容发送
+TRANSLATION_FIELDS = (
+    "title_en (official English title; pick the widely used one if there are aliases), "
+    "comment_en (natural English translation of comment_zh; empty string if absent), "
+    "people_en (English names for the people list, same order; no nationalities or descriptors; empty string when unknown)."
+)
+
 STRUCTURED_SYSTEM_PROMPT = (
-    "You are a bilingual expert who maps Douban entries to official English data. "
-    "Return a JSON object with three fields: "
-    "title_en (official English release title; if multiple aliases exist, pick the widely used official one), "
-    "comment_en (natural English translation of the review; empty string if absent), and "
-    "people_en (English names for the provided people list; do not include nationalities or extra descriptors; use empty string when unknown). "
-    "You will receive Chinese title plus author/director context to disambiguate. "
-    "Only return JSON, no extra text."
+    "You map a Douban entry (category, title_zh, comment_zh, people as author/director context) "
+    "to official English data. Return a JSON object with: " + TRANSLATION_FIELDS
+)
+
+BATCH_SYSTEM_PROMPT = (
+    "You map Douban entries (idx, category, title_zh, comment_zh, people as author/director context) "
+    "to official English data. Return a JSON object {\"results\": [...]} with one object per entry, "
+    "each with: idx (copied from the input), " + TRANSLATION_FIELDS
 )
 
 PERSON_SYSTEM_PROMPT = (
-    "You transliterate and normalize Chinese personal names into their standard English renderings. "
-    "Return only the English name, no explanations, no brackets, no nationality, no titles."
+    "You normalize Chinese personal names into their standard English renderings. "
+    "Given a JSON array of names, return a JSON object {\"names\": [...]} with the English names in the same order; "
+    "no explanations, brackets, nationalities or titles."
 )
 
+# Qwen 的 OpenAI 兼容接口支持 JSON mode，保证返回可解析的 JSON 对象
+JSON_MODE = {"type": "json_object"}
+
+
+def load_person_cache(path: Path) -> Dict[str, str]:
+    if not path.exists():
+        return {}
+    try:
+        data = orjson.loads(path.read_bytes())
+    except orjson.JSONDecodeError:
+        return {}  # 中断时可能留下写了一半的文件
+    return data if isinstance(data, dict) else {}
+
+
+person_cache: Dict[str, str] = load_person_cache(PERSON_CACHE_FILE)
+# 正在翻译中的人名 -> 对应请求完成时置位的 Future，并发的批次遇到同名时等它而不是重复请求
+people_in_flight: Dict[str, "asyncio.Future[None]"] = {}
+
+
+def save_person_cache() -> None:
+    # 先写临时文件再原子替换，中途被打断也不会留下残缺的缓存
+    tmp = PERSON_CACHE_FILE.with_name(PERSON_CACHE_FILE.name + ".tmp")
+    tmp.write_bytes(orjson.dumps(person_cache, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, PERSON_CACHE_FILE)
 
-def translate_text(text: str) -> str:
+
+async def chat(messages: List[Dict], **kwargs) -> str:
+    async with qwen_sem, qwen_limiter:
+        resp = await qwen_client.chat.completions.create(model=QWEN_MODEL, messages=messages, **kwargs)
+    return resp.choices[0].message.content.strip()
+
+
+async def translate_text(text: str) -> str:
     if not text.strip():
         return ""
-    resp = qwen_client.chat.completions.create(
-        model=QWEN_MODEL,
-        messages=[
+    return await chat(
+        [
             {"role": "system", "content": REVIEW_SYSTEM_PROMPT},
             {"role": "user", "content": text},
         ],
         temperature=0.2,
         max_tokens=800,
     )
-    return resp.choices[0].message.content.strip()
 
 
-def translate_people_list(people: List[str]) -> List[str]:
-    translated: List[str] = []
-    for p in people:
-        name = p.strip()
-        if not name:
-            continue
+async def translate_people_list(people: List[str]) -> List[str]:
+    names = [p.strip() for p in people if p.strip()]
+    unique = [n for n in dict.fromkeys(names) if n not in person_cache]
+    waiting = {people_in_flight[n] for n in unique if n in people_in_flight}
+    missing = [n for n in unique if n not in people_in_flight]
+    if missing:
+        done = asyncio.get_running_loop().create_future()
+        for n in missing:
+            people_in_flight[n] = done
         try:
-            resp = qwen_client.chat.completions.create(
-                model=QWEN_MODEL,
-                messages=[
+            content = await chat(
+                [
                     {"role": "system", "content": PERSON_SYSTEM_PROMPT},
-                    {"role": "user", "content": name},
+                    {"role": "user", "content": orjson.dumps(missing).decode()},
                 ],
                 temperature=0.0,
-                max_tokens=50,
+                max_tokens=50 * len(missing),
+                response_format=JSON_MODE,
             )
-            en_name = resp.choices[0].message.content.strip()
+            data = orjson.loads(content).get("names")
+            if isinstance(data, list) and len(data) == len(missing):
+                for name, en in zip(missing, data):
+                    if isinstance(en, str) and en.strip():
+                        person_cache[name] = en.strip()
         except Exception:
-            en_name = name
-        translated.append(en_name)
-    return translated
+            pass
+        finally:
+            for n in missing:
+                people_in_flight.pop(n, None)
+            done.set_result(None)
+    if waiting:
+        await asyncio.gather(*waiting)
+    return [person_cache.get(n, n) for n in names]
+
+
+def resolve_people(people: List[str], people_en: List[str]) -> Optional[List[str]]:
+    """人名优先用缓存；否则采用结构化翻译给出的译名并按位置记入缓存。"""
+    names = [p.strip() for p in people if p.strip()]
+    if names and all(n in person_cache for n in names):
+        return [person_cache[n] for n in names]
+    if not people_en:
+        return None
+    if len(people_en) == len(names):
+        for name, en in zip(names, people_en):
+            if en:
+                person_cache.setdefault(name, en)
+    return people_en
 
 
 def detect_english_from_title(raw_title: str) -> Optional[str]:
     """从原始标题里提取已有英文别名（/、| 分隔）。"""
     if not raw_title:
         return None
-    parts = [p.strip() for p in re.split(r"[／/|]", raw_title) if p.strip()]
+    parts = [p.strip() for p in TITLE_ALT_SPLIT_RE.split(raw_title) if p.strip()]
     for p in parts:
-        if re.search(r"[A-Za-z]", p):
+        if HAS_LATIN_RE.search(p):
             return p
     return None
 
 
-def translate_title_and_comment(
+def parse_translation(data: Dict) -> Dict:
+    title_en = (data.get("title_en") or "").strip()
+    comment_en = (data.get("comment_en") or "").strip()
+    people_en: List[str] = []
+    raw_people_en = data.get("people_en")
+    if isinstance(raw_people_en, list):
+        people_en = [(p or "").strip() for p in raw_people_en if isinstance(p, str)]
+    return {"title_en": title_en, "comment_en": comment_en, "people_en": people_en}
+
+
+async def translate_title_and_comment(
     title_zh: str,
     comment_zh: str,
     category: str,
@@ -111,7 +198,7 @@ def translate_title_and_comment(
     }
     messages = [
         {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
-        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+        {"role": "user", "content": orjson.dumps(payload).decode()},
     ]
 
     title_en = ""
@@ -119,111 +206,195 @@ def translate_title_and_comment(
     people_en: List[str] = []
 
     try:
-        resp = qwen_client.chat.completions.create(
-            model=QWEN_MODEL,
-            messages=messages,
-            temperature=0.2,
-            max_tokens=800,
-        )
-        content = resp.choices[0].message.content.strip()
-        data = json.loads(content)
-        title_en = (data.get("title_en") or "").strip()
-        comment_en = (data.get("comment_en") or "").strip()
-        raw_people_en = data.get("people_en")
-        if isinstance(raw_people_en, list):
-            people_en = [(p or "").strip() for p in raw_people_en if isinstance(p, str)]
+        content = await chat(messages, temperature=0.2, max_tokens=800, response_format=JSON_MODE)
+        return parse_translation(orjson.loads(content))
     except Exception as e:
         print(f"\n[WARN] structured translation failed, falling back: {e}")
-        title_en = translate_text(title_zh)
-        comment_en = translate_text(comment_zh)
+        title_en, comment_en = await asyncio.gather(translate_text(title_zh), translate_text(comment_zh))
         people_en = []
     return {"title_en": title_en, "comment_en": comment_en, "people_en": people_en}
 
 
-def translate_all(items: List[Dict], save_path: Path) -> List[Dict]:
-    translated: List[Dict] = []
-    for item in tqdm(items, desc=f"Translating -> {save_path.name}"):
-        title_zh = (item.get("title_zh") or "").strip()
-        comment_zh = (item.get("comment_zh") or "").strip()
-        category = (item.get("category") or "").strip()
+async def translate_single(payload: Dict) -> Dict:
+    try:
+        return await translate_title_and_comment(
+            payload["title_zh"], payload["comment_zh"], payload["category"], payload["people"]
+        )
+    except Exception as e:
+        print(f"\n[ERROR] translate failed: {e}")
+        return {"title_en": "", "comment_en": "", "people_en": []}
+
+
+async def translate_chunk(batch: List[Dict]) -> List[Dict]:
+    entries = [{"idx": i, **payload} for i, payload in enumerate(batch)]
+    by_idx: Dict[int, Dict] = {}
+    try:
+        content = await chat(
+            [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": orjson.dumps(entries).decode()},
+            ],
+            temperature=0.2,
+            max_tokens=800 * len(batch),
+            response_format=JSON_MODE,
+        )
+        for row in orjson.loads(content).get("results") or []:
+            if isinstance(row, dict) and isinstance(row.get("idx"), int):
+                by_idx[row["idx"]] = parse_translation(row)
+    except Exception as e:
+        print(f"\n[WARN] batch translation failed, falling back to single items: {e}")
+
+    missing = [i for i in range(len(batch)) if i not in by_idx]
+    for i, trans in zip(missing, await asyncio.gather(*[translate_single(batch[i]) for i in missing])):
+        by_idx[i] = trans
+    return [by_idx[i] for i in range(len(batch))]
 
-        people: List[str] = []
-        if category == "book":
-            people = item.get("authors_zh") or []
-        elif category == "movie":
-            people = item.get("directors_zh") or []
 
-        source_url = item.get("subject_url") or ""
+async def translate_batch(items: List[Dict], batch_size: int = BATCH_SIZE) -> List[Dict]:
+    """一次请求翻译多条 payload（category/title_zh/comment_zh/people），按 idx 对回结果。"""
+    chunks = await asyncio.gather(*[
+        translate_chunk(items[start:start + batch_size]) for start in range(0, len(items), batch_size)
+    ])
+    return [trans for chunk in chunks for trans in chunk]
 
-        detected_en = detect_english_from_title(title_zh) if category == "movie" else None
 
+def load_progress(path: Path) -> Dict[str, Dict]:
+    """读取 .jsonl 续跑记录，按 subject_url 索引已翻译的条目。"""
+    done: Dict[str, Dict] = {}
+    if not path.exists():
+        return done
+    for line in path.read_bytes().splitlines():
+        if not line.strip():
+            continue
         try:
-            trans = translate_title_and_comment(title_zh, comment_zh, category, people)
-        except Exception as e:
-            print(f"\n[ERROR] translate failed: {e}")
-            trans = {"title_en": "", "comment_en": ""}
-
-        title_en_final = detected_en or trans.get("title_en", "")
-        comment_en_final = trans.get("comment_en", "")
-        people_en = trans.get("people_en") if isinstance(trans, dict) else []
-        if not isinstance(people_en, list):
-            people_en = []
-        rating_en = item.get("rating") if isinstance(item.get("rating"), int) else None
-
-        out = {
-            "category": category,
-            "title": title_en_final,
-            "comment": comment_en_final,
-            "rating": rating_en,
-            "subject_url": source_url,
-        }
-        if category == "book":
-            names = people_en if people_en else translate_people_list(people)
-            out["author"] = " / ".join(names)
-        elif category == "movie":
-            names = people_en if people_en else translate_people_list(people)
-            out["director"] = " / ".join(names)
-
-        translated.append(out)
-
-        save_path.write_text(
-            json.dumps(translated, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-        time.sleep(0.5)
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue  # 中断时可能留下半行
+        url = row.get("subject_url") if isinstance(row, dict) else None
+        if url:
+            done[url] = row
+    return done
+
+
+def build_payload(item: Dict) -> Dict:
+    category = (item.get("category") or "").strip()
+    people: List[str] = []
+    if category == "book":
+        people = item.get("authors_zh") or []
+    elif category == "movie":
+        people = item.get("directors_zh") or []
+    return {
+        "category": category or "work",
+        "title_zh": (item.get("title_zh") or "").strip(),
+        "comment_zh": (item.get("comment_zh") or "").strip(),
+        "people": people,
+    }
+
 
-    return translated
+async def build_output(item: Dict, payload: Dict, trans: Dict) -> Dict:
+    category = (item.get("category") or "").strip()
+    detected_en = detect_english_from_title(payload["title_zh"]) if category == "movie" else None
+
+    title_en_final = detected_en or trans.get("title_en", "")
+    comment_en_final = trans.get("comment_en", "")
+    people_en = trans.get("people_en")
+    if not isinstance(people_en, list):
+        people_en = []
+    rating_en = item.get("rating") if isinstance(item.get("rating"), int) else None
+
+    out = {
+        "category": category,
+        "title": title_en_final,
+        "comment": comment_en_final,
+        "rating": rating_en,
+        "subject_url": item.get("subject_url") or "",
+    }
+    if category in ("book", "movie"):
+        names = resolve_people(payload["people"], people_en)
+        if names is None:
+            names = await translate_people_list(payload["people"])
+        out["author" if category == "book" else "director"] = " / ".join(names)
+    return out
+
+
+async def translate_group(items: List[Dict], idxs: List[int]) -> Tuple[List[int], List[Dict]]:
+    payloads = [build_payload(items[i]) for i in idxs]
+    trans_list = await translate_batch(payloads)
+    outs = await asyncio.gather(*[
+        build_output(items[i], payload, trans) for i, payload, trans in zip(idxs, payloads, trans_list)
+    ])
+    return idxs, list(outs)
+
+
+async def translate_all(items: List[Dict], save_path: Path) -> List[Dict]:
+    # 每条结果追加写入 .jsonl 以便中断续跑，完整 JSON 只按检查点和结束时重写
+    progress_path = save_path.with_suffix(".jsonl")
+    done = load_progress(progress_path)
+    if done:
+        print(f"[INFO] resume from {progress_path}: {len(done)} items already translated")
+
+    translated: List[Optional[Dict]] = [done.get(item.get("subject_url") or "") for item in items]
+    pending = [i for i, row in enumerate(translated) if row is None]
+    groups = [pending[start:start + BATCH_SIZE] for start in range(0, len(pending), BATCH_SIZE)]
+    since_checkpoint = 0
+
+    # 各批并发请求，谁先完成谁先落盘；最终顺序按 items 下标还原
+    with progress_path.open("a", encoding="utf-8", buffering=1) as progress, tqdm(
+        total=len(items), initial=len(items) - len(pending), desc=f"Translating -> {save_path.name}"
+    ) as pbar:
+        for fut in asyncio.as_completed([translate_group(items, idxs) for idxs in groups]):
+            idxs, outs = await fut
+            for i, out in zip(idxs, outs):
+                translated[i] = out
+                progress.write(orjson.dumps(out).decode() + "\n")
+            progress.flush()
+            pbar.update(len(idxs))
+
+            since_checkpoint += len(idxs)
+            if since_checkpoint >= CHECKPOINT_EVERY:
+                save_path.write_bytes(orjson.dumps([row for row in translated if row], option=orjson.OPT_INDENT_2))
+                save_person_cache()
+                since_checkpoint = 0
+
+    result = [row for row in translated if row]
+    save_path.write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+    save_person_cache()
+    progress_path.unlink()
+    return result
 
 
 def load_items(path: Path) -> List[Dict]:
     if not path.exists():
         print(f"[WARN] {path} not found, skip.")
         return []
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = orjson.loads(path.read_bytes())
     if not isinstance(data, list):
         raise ValueError(f"{path} 内容不是列表")
     return data
 
 
-def translate_category(raw_file: str, translated_file: str) -> List[Dict]:
+async def translate_category(raw_file: str, translated_file: str) -> List[Dict]:
     items = load_items(Path(raw_file))
     if not items:
         return []
-    return translate_all(items, Path(translated_file))
+    return await translate_all(items, Path(translated_file))
+
+
+async def translate_everything() -> Tuple[List[Dict], List[Dict]]:
+    books = await translate_category(BOOK_RAW_FILE, BOOK_TRANSLATED_FILE)
+    movies = await translate_category(MOVIE_RAW_FILE, MOVIE_TRANSLATED_FILE)
+    return books, movies
 
 
 def main():
     if not QWEN_API_KEY:
         raise ValueError("请设置 QWEN_API_KEY（DashScope 密钥）。")
 
-    books = translate_category(BOOK_RAW_FILE, BOOK_TRANSLATED_FILE)
-    movies = translate_category(MOVIE_RAW_FILE, MOVIE_TRANSLATED_FILE)
+    # 共用同一个事件循环，限速器和客户端连接池在书/电影之间复用
+    books, movies = asyncio.run(translate_everything())
 
     all_items = books + movies
-    Path(ALL_TRANSLATED_FILE).write_text(
-        json.dumps(all_items, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    Path(ALL_TRANSLATED_FILE).write_bytes(orjson.dumps(all_items, option=orjson.OPT_INDENT_2))
     print(
         f"[SUMMARY] translated books={len(books)}, movies={len(movies)}, total={len(all_items)}"
     )
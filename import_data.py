@@ -1,11 +1,11 @@
 """把翻译后的书评/影评发布到 Goodreads/IMDb。"""
 
-import json
 import os
 import time
 from pathlib import Path
 from typing import Dict, List, Optional
 
+import orjson
 from playwright.sync_api import Playwright, sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 # 数据文件
@@ -22,13 +22,37 @@ IMDB_PROFILE_DIR = Path(".pw_imdb_profile")
 
 HEADLESS = os.getenv("HEADLESS", "0") == "1"
 WAIT_FOR_LOGIN = os.getenv("WAIT_FOR_LOGIN", "1") == "1"
+# 发布时拦截的资源类型；样式表保留，可见性判断依赖 CSS
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+
+# 编辑器入口链接和评论输入框的候选选择器
+GOODREADS_EDITOR_LINKS = [
+    "a[href*='/review/new']",
+    "a.writeReviewLink",
+    "button[data-analytics-id='new_review']",
+    "a[data-analytics-id='new_review']",
+]
+IMDB_EDITOR_LINKS = [
+    "a[href*='/review/create']",
+    "a[href*='/reviews/write']",
+    "a.ipc-button",
+]
+GOODREADS_REVIEW_INPUTS = [
+    "#review_review_text",
+    "textarea[name='review[review]']",
+    "textarea#review_text",
+    "textarea[id*='review']",
+]
+IMDB_REVIEW_INPUTS = ["textarea", "textarea[name*='review']"]
+# 导航后第一次等待页面元素的超时（毫秒），之后的单步操作仍用 3 秒
+NAV_TIMEOUT = 8000
 
 
 def load_list_json(path: Path) -> List[Dict]:
     if not path.exists():
         print(f"[WARN] {path} not found, skip.")
         return []
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = orjson.loads(path.read_bytes())
     if not isinstance(data, list):
         raise ValueError(f"{path} 内容不是列表")
     return data
@@ -38,7 +62,7 @@ def load_mapping(path: Path) -> Dict[str, str]:
     if not path.exists():
         print(f"[WARN] {path} not found, skip.")
         return {}
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = orjson.loads(path.read_bytes())
     mapping: Dict[str, str] = {}
     for entry in data:
         if not isinstance(entry, dict):
@@ -67,6 +91,15 @@ def prompt_login(page, home_url: str, label: str) -> None:
     input(f"[{label}] 请在弹出的浏览器中登录后按回车继续...")
 
 
+def block_heavy_resources(context) -> None:
+    context.route(
+        "**/*",
+        lambda route: route.abort()
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES
+        else route.continue_(),
+    )
+
+
 def convert_rating_for_goodreads(rating: Optional[int]) -> Optional[int]:
     if rating is None:
         return None
@@ -81,49 +114,63 @@ def convert_rating_for_imdb(rating: Optional[int]) -> Optional[int]:
     return imdb_rating
 
 
-def click_first_available(page, selectors: List[str]) -> bool:
+def first_available(page, selectors: List[str], timeout: int = 3000):
+    """用 Locator.or_ 合并候选选择器只等一次，再按列表优先级返回第一个可见的元素。
+
+    只在可见元素里找：隐藏的同类元素（如 reCAPTCHA 的 textarea）排在前面也不影响。
+    """
+    combined = page.locator(selectors[0])
+    for sel in selectors[1:]:
+        combined = combined.or_(page.locator(sel))
+    try:
+        combined.locator("visible=true").first.wait_for(state="visible", timeout=timeout)
+    except PlaywrightTimeoutError:
+        return None
     for sel in selectors:
-        try:
-            page.click(sel, timeout=3000)
-            return True
-        except Exception:
-            continue
-    return False
+        loc = page.locator(sel).locator("visible=true").first
+        if loc.count():
+            return loc
+    return None
 
 
-def fill_first_available(page, selectors: List[str], text: str) -> bool:
-    for sel in selectors:
-        try:
-            page.fill(sel, text, timeout=3000)
-            return True
-        except Exception:
-            continue
-    return False
+def click_first_available(page, selectors: List[str], timeout: int = 3000) -> bool:
+    loc = first_available(page, selectors, timeout)
+    if loc is None:
+        return False
+    try:
+        loc.click(timeout=3000)
+        return True
+    except Exception:
+        return False
+
+
+def fill_first_available(page, selectors: List[str], text: str, timeout: int = 3000) -> bool:
+    loc = first_available(page, selectors, timeout)
+    if loc is None:
+        return False
+    try:
+        loc.fill(text, timeout=3000)
+        return True
+    except Exception:
+        return False
+
+
+def goto_and_wait(page, url: str, selectors: List[str], timeout: int = NAV_TIMEOUT) -> None:
+    """导航只等到 commit，再等需要的元素可见，不必等整页 DOM（含统计脚本）解析完。"""
+    page.goto(url, wait_until="commit")
+    first_available(page, selectors, timeout)
 
 
 def open_goodreads_editor(page, target_url: str) -> None:
-    page.goto(target_url, wait_until="domcontentloaded")
-    click_first_available(
-        page,
-        [
-            "a[href*='/review/new']",
-            "a.writeReviewLink",
-            "button[data-analytics-id='new_review']",
-            "a[data-analytics-id='new_review']",
-        ],
-    )
+    goto_and_wait(page, target_url, GOODREADS_EDITOR_LINKS)
+    if click_first_available(page, GOODREADS_EDITOR_LINKS):
+        # 点击入口会跳到编辑页，给编辑页加载留出导航级别的等待时间
+        first_available(page, GOODREADS_REVIEW_INPUTS, NAV_TIMEOUT)
 
 
 def open_imdb_editor(page, target_url: str) -> None:
-    page.goto(target_url, wait_until="domcontentloaded")
-    click_first_available(
-        page,
-        [
-            "a[href*='/review/create']",
-            "a[href*='/reviews/write']",
-            "a.ipc-button",
-        ],
-    )
+    goto_and_wait(page, target_url, IMDB_EDITOR_LINKS)
+    click_first_available(page, IMDB_EDITOR_LINKS)
 
 
 def post_goodreads_review(page, target_url: str, rating: Optional[int], comment: str) -> None:
@@ -138,16 +185,7 @@ def post_goodreads_review(page, target_url: str, rating: Optional[int], comment:
                 f'label[for=\"review_rating_{rating}\"]',
             ],
         )
-    filled = fill_first_available(
-        page,
-        [
-            "#review_review_text",
-            "textarea[name='review[review]']",
-            "textarea#review_text",
-            "textarea[id*='review']",
-        ],
-        comment,
-    )
+    filled = fill_first_available(page, GOODREADS_REVIEW_INPUTS, comment)
     if not filled:
         raise RuntimeError("找不到 Goodreads 评论输入框，需手动调整选择器")
     if not click_first_available(
@@ -165,7 +203,7 @@ def post_goodreads_review(page, target_url: str, rating: Optional[int], comment:
 
 
 def post_imdb_review(page, target_url: str, rating: Optional[int], comment: str) -> None:
-    page.goto(target_url, wait_until="domcontentloaded")
+    goto_and_wait(page, target_url, IMDB_REVIEW_INPUTS)
     # IMDb 用户影评页面通常有评分星星和 textarea
     if rating:
         # IMDb 星星可能是按钮或 input，尝试常见选择器
@@ -173,7 +211,7 @@ def post_imdb_review(page, target_url: str, rating: Optional[int], comment: str)
             page,
             [f"button[aria-label='{rating}']", f"input[name='rating'][value='{rating}']", "span.star-rating-icon"],
         )
-    filled = fill_first_available(page, ["textarea", "textarea[name*='review']"], comment)
+    filled = fill_first_available(page, IMDB_REVIEW_INPUTS, comment)
     if not filled:
         raise RuntimeError("找不到 IMDb 评论输入框，需手动调整选择器")
     if not click_first_available(page, ["button[type='submit']", "input[type='submit']"]):
@@ -188,6 +226,7 @@ def process_goodreads(p: Playwright, items: List[Dict], mapping: Dict[str, str])
     )
     page = browser.new_page()
     prompt_login(page, "https://www.goodreads.com/", "Goodreads")
+    block_heavy_resources(browser)  # 登录后再拦截，避免影响验证码等图片
     for item in items:
         target_url = get_target_url(mapping, item)
         if not target_url:
@@ -212,6 +251,7 @@ def process_imdb(p: Playwright, items: List[Dict], mapping: Dict[str, str]) -> N
     )
     page = browser.new_page()
     prompt_login(page, "https://www.imdb.com/", "IMDb")
+    block_heavy_resources(browser)  # 登录后再拦截，避免影响验证码等图片
     for item in items:
         target_url = get_target_url(mapping, item)
         if not target_url:
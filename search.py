@@ -1,11 +1,15 @@
 import argparse
-import json
+import os
+import re
 import time
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests_cache import DEFAULT_IGNORED_PARAMS, DO_NOT_CACHE, CachedSession
+from bs4 import BeautifulSoup, SoupStrainer
 from tqdm import tqdm
 
 BOOKS_FILE = Path("douban_books_translated.json")
@@ -20,6 +24,14 @@ USER_AGENT = os.getenv(
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
 )
 ACCEPT_LANGUAGE = os.getenv("ACCEPT_LANGUAGE", "en-US,en;q=0.9")
+# 搜索结果缓存到本地 SQLite，重复运行时直接读盘；设为 0 即完全不缓存
+HTTP_CACHE_FILE = ".http_cache.sqlite"
+HTTP_CACHE_EXPIRE = int(os.getenv("HTTP_CACHE_EXPIRE", "86400"))
+
+# 搜索结果页只解析结果链接所在的子树；class 用正则按词匹配，
+# 否则解析阶段遇到多值 class（如 "bookTitle big"）会匹配不上
+GOODREADS_STRAINER = SoupStrainer(class_=re.compile(r"(^|\s)bookTitle(\s|$)"))
+IMDB_STRAINER = SoupStrainer("td", class_=re.compile(r"(^|\s)result_text(\s|$)"))
 
 
 def make_headers(use_cookie: str = "") -> Dict[str, str]:
@@ -27,34 +39,50 @@ def make_headers(use_cookie: str = "") -> Dict[str, str]:
         "User-Agent": USER_AGENT,
         "Accept-Language": ACCEPT_LANGUAGE,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Encoding": "gzip, deflate, br",
     }
     if use_cookie:
         headers["Cookie"] = use_cookie
     return headers
 
 
-def fetch_html(url: str, headers: Dict[str, str], timeout: int = 10) -> Optional[str]:
+def make_session(use_cookie: str = "") -> requests.Session:
+    # Cookie 不进缓存键，也不随请求一起写入 SQLite
+    s = CachedSession(
+        HTTP_CACHE_FILE,
+        expire_after=HTTP_CACHE_EXPIRE if HTTP_CACHE_EXPIRE > 0 else DO_NOT_CACHE,
+        allowable_methods=("GET",),
+        ignored_parameters=[*DEFAULT_IGNORED_PARAMS, "Cookie"],
+    )
+    s.headers.update(make_headers(use_cookie))
+    return s
+
+
+def fetch_html(session: requests.Session, url: str, timeout: int = 10) -> Tuple[Optional[str], bool]:
+    """返回 (html, from_cache)；命中本地缓存时调用方不必再等请求间隔。"""
     try:
-        resp = requests.get(url, headers=headers, timeout=timeout)
+        resp = session.get(url, timeout=timeout)
+        from_cache = getattr(resp, "from_cache", False)
         if resp.status_code == 200:
-            return resp.text
+            return resp.text, from_cache
         print(f"[WARN] {url} -> {resp.status_code}")
+        return None, from_cache
     except Exception as e:
         print(f"[WARN] fetch {url} failed: {e}")
-    return None
+    return None, False
 
 
 def load_items(path: Path) -> List[Dict]:
     if not path.exists():
         return []
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = orjson.loads(path.read_bytes())
     return data if isinstance(data, list) else []
 
 
 def load_mapping(path: Path) -> Dict[str, str]:
     if not path.exists():
         return {}
-    raw = json.loads(path.read_text(encoding="utf-8"))
+    raw = orjson.loads(path.read_bytes())
     mapping: Dict[str, str] = {}
     for row in raw:
         if not isinstance(row, dict):
@@ -68,18 +96,19 @@ def load_mapping(path: Path) -> Dict[str, str]:
 
 def save_mapping(path: Path, mapping: Dict[str, str]) -> None:
     rows = [{"subject_url": k, "target_url": v} for k, v in mapping.items()]
-    path.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    path.write_bytes(orjson.dumps(rows, option=orjson.OPT_INDENT_2))
     print(f"[INFO] saved {len(rows)} rows to {path}")
 
 
-def search_goodreads(title: str, author: str, delay: float) -> Optional[str]:
-    q = "+".join([part for part in [title, author] if part]).replace(" ", "+")
-    url = f"https://www.goodreads.com/search?q={q}"
-    html = fetch_html(url, make_headers(GOODREADS_COOKIE))
-    time.sleep(delay)
+def search_goodreads(session: requests.Session, title: str, author: str, delay: float) -> Optional[str]:
+    q = " ".join(part for part in (title, author) if part)
+    url = "https://www.goodreads.com/search?" + urlencode({"q": q})
+    html, from_cache = fetch_html(session, url)
+    if not from_cache:
+        time.sleep(delay)
     if not html:
         return None
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml", parse_only=GOODREADS_STRAINER)
     a = soup.select_one("a.bookTitle") or soup.select_one(".bookTitle")
     if a and a.get("href"):
         href = a.get("href")
@@ -89,14 +118,15 @@ def search_goodreads(title: str, author: str, delay: float) -> Optional[str]:
     return None
 
 
-def search_imdb(title: str, director: str, delay: float) -> Optional[str]:
-    q = "+".join([part for part in [title, director] if part]).replace(" ", "+")
-    url = f"https://www.imdb.com/find/?q={q}&s=tt&ttype=ft"
-    html = fetch_html(url, make_headers(IMDB_COOKIE))
-    time.sleep(delay)
+def search_imdb(session: requests.Session, title: str, director: str, delay: float) -> Optional[str]:
+    q = " ".join(part for part in (title, director) if part)
+    url = "https://www.imdb.com/find/?" + urlencode({"q": q, "s": "tt", "ttype": "ft"})
+    html, from_cache = fetch_html(session, url)
+    if not from_cache:
+        time.sleep(delay)
     if not html:
         return None
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml", parse_only=IMDB_STRAINER)
     a = soup.select_one("td.result_text a")
     if a and a.get("href"):
         href = a.get("href")
@@ -106,7 +136,9 @@ def search_imdb(title: str, director: str, delay: float) -> Optional[str]:
     return None
 
 
-def build_goodreads_mapping(items: List[Dict], existing: Dict[str, str], delay: float, overwrite: bool) -> Dict[str, str]:
+def build_goodreads_mapping(
+    session: requests.Session, items: List[Dict], existing: Dict[str, str], delay: float, overwrite: bool
+) -> Dict[str, str]:
     mapping = dict(existing)
     for item in tqdm(items, desc="Search Goodreads"):
         src = item.get("subject_url")
@@ -116,13 +148,15 @@ def build_goodreads_mapping(items: List[Dict], existing: Dict[str, str], delay:
             continue
         title = item.get("title") or item.get("title_en") or ""
         author = item.get("author") or ""
-        target = search_goodreads(title, author, delay)
+        target = search_goodreads(session, title, author, delay)
         if target:
             mapping[src] = target
     return mapping
 
 
-def build_imdb_mapping(items: List[Dict], existing: Dict[str, str], delay: float, overwrite: bool) -> Dict[str, str]:
+def build_imdb_mapping(
+    session: requests.Session, items: List[Dict], existing: Dict[str, str], delay: float, overwrite: bool
+) -> Dict[str, str]:
     mapping = dict(existing)
     for item in tqdm(items, desc="Search IMDb"):
         src = item.get("subject_url")
@@ -132,7 +166,7 @@ def build_imdb_mapping(items: List[Dict], existing: Dict[str, str], delay: float
             continue
         title = item.get("title") or item.get("title_en") or ""
         director = item.get("director") or ""
-        target = search_imdb(title, director, delay)
+        target = search_imdb(session, title, director, delay)
         if target:
             mapping[src] = target
     return mapping
@@ -150,8 +184,13 @@ def main():
     gr_map = load_mapping(GOODREADS_OUT)
     imdb_map = load_mapping(IMDB_OUT)
 
-    gr_map = build_goodreads_mapping(books, gr_map, args.delay, args.overwrite)
-    imdb_map = build_imdb_mapping(movies, imdb_map, args.delay, args.overwrite)
+    # 每个站点一个长连接 Session，避免每次查询都重新握手
+    gr_session = make_session(GOODREADS_COOKIE)
+    imdb_session = make_session(IMDB_COOKIE)
+    gr_session.cache.delete(expired=True)  # 两个 Session 共用同一个缓存文件，清理一次即可
+
+    gr_map = build_goodreads_mapping(gr_session, books, gr_map, args.delay, args.overwrite)
+    imdb_map = build_imdb_mapping(imdb_session, movies, imdb_map, args.delay, args.overwrite)
 
     save_mapping(GOODREADS_OUT, gr_map)
     save_mapping(IMDB_OUT, imdb_map)